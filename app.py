@@ -4,7 +4,7 @@
 # - Supervisores capturan lavados con 4 fotos (frente, atrás, lado, cabina)
 # - Bloqueo de fotos repetidas por hash SHA-256 (global, consultando BD)
 # - Catálogos desde ./data/*.json
-# - Export CSV/XLSX y export a carpetas por semana
+# - Export CSV/XLSX/Parquet y export a carpetas por semana
 # - Admin NO captura ni borra; solo ver/exportar/gestionar usuarios
 # - Reportes y gráficos (KPIs + barras por CEDIS / supervisor)
 # - Boot-guard: muestra errores en pantalla
@@ -12,14 +12,23 @@
 
 from __future__ import annotations
 
-import os, io, csv, json, uuid, hashlib, shutil, traceback, warnings
+import os, io, csv, json, uuid, base64, hashlib, hmac, shutil, traceback, warnings, zipfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from typing import Any, Dict, List, Optional, Tuple
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 import streamlit as st
+import xlsxwriter
+import pyarrow as pa
+import pyarrow.parquet as pq
 from PIL import Image, ImageOps
 
+from textnorm import norm  # módulo aparte: su caché sobrevive a los reruns
+
 # ======================= Page config (UNA sola vez) =======================
 if "page_config_done" not in st.session_state:
     st.set_page_config(page_title="Lavado semanal", layout="wide")
@@ -35,11 +44,44 @@ def keep_alive():
 
 # ======================= Capa de datos (db.py) ============================
 from db import (
-    init_db, healthcheck,
+    init_db, healthcheck, session_scope,
     upsert_user, get_user, list_users,
-    save_lavado, get_lavados_week, delete_lavado, photo_hashes_all
+    save_lavado, get_lavados_week, get_lavados_week_filtered, get_lavados_week_lite,
+    delete_lavados, photo_hashes_exist
 )
 
+@st.cache_data(ttl=30, show_spinner=False)
+def lavados_semana(week: str) -> List[Dict[str, Any]]:
+    # Una consulta por semana cada 30 s como máximo; las escrituras la invalidan
+    return get_lavados_week(week)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def lavados_semana_filtrada(week: str, cedis: Optional[str], segmento: Optional[str],
+                            supervisor_id: Optional[str]) -> List[Dict[str, Any]]:
+    return get_lavados_week_filtered(week, cedis=cedis, segmento=segmento, supervisor_id=supervisor_id)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def lavados_semana_lite(week: str, supervisor_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    # Para KPIs/gráficos: sin las columnas JSON de fotos
+    return get_lavados_week_lite(week, supervisor_id=supervisor_id)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def lavados_busqueda(week: str, cedis: Optional[str], segmento: Optional[str],
+                     supervisor_id: Optional[str]) -> Dict[str, str]:
+    # id -> texto normalizado (unidad + supervisor); se calcula una vez por llenado de caché
+    # y no viaja dentro de los registros (terminaría en record.json)
+    return {r["id"]: lavado_texto(r) for r in lavados_semana_filtrada(week, cedis, segmento, supervisor_id)}
+
+def lavado_texto(r: Dict[str, Any]) -> str:
+    return f'{norm(r["unidadLabel"])}\x1f{norm(r["supervisorNombre"])}'
+
+def lavados_changed():
+    # Limpia para todas las sesiones (un contador por sesión dejaría a las demás viendo datos viejos)
+    lavados_semana.clear()
+    lavados_semana_filtrada.clear()
+    lavados_semana_lite.clear()
+    lavados_busqueda.clear()
+
 # (por si alguna lib usa parámetros viejos)
 warnings.filterwarnings(
     "ignore",
@@ -86,15 +128,20 @@ def inject_css():
     </style>
     """, unsafe_allow_html=True)
 
-# --- Compat helper para st.image en versiones viejas/nuevas ---
-def show_image(col, img, **kwargs):
+# --- Miniaturas para st.column_config.ImageColumn (no acepta rutas locales) ---
+# La clave es el hash de contenido de la foto (inmutable); _path no entra en la clave.
+# Si el archivo no existe devuelve None: no hace falta os.path.exists antes.
+@st.cache_data(show_spinner=False, max_entries=4000)
+def photo_thumb_uri(photo_hash: str, _path: str) -> Optional[str]:
     try:
-        return col.image(img, use_container_width=True, **kwargs)
-    except TypeError:
-        try:
-            return col.image(img, use_column_width=True, **kwargs)
-        except TypeError:
-            return col.image(img, **kwargs)
+        img = Image.open(_path)
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((240, 240))
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=70)
+    except Exception:
+        return None
+    return "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode("ascii")
 
 # ========================== Boot Guard ===========================
 
@@ -113,12 +160,7 @@ def boot_guard(fn):
 BASE_DIR     = os.getenv("DATA_DIR", "store")
 EVIDENCE_DIR = os.path.join(BASE_DIR, "evidence")
 WEEKS_DIR    = os.path.join(BASE_DIR, "semanas")
-
-def norm(s: Any) -> str:
-    import unicodedata
-    return unicodedata.normalize("NFD", str(s or ""))\
-        .encode("ascii", "ignore").decode("ascii")\
-        .lower().strip()
+EXPORT_WORKERS = 16
 
 def iso_week_key(d: Optional[date] = None) -> str:
     d = d or date.today()
@@ -141,50 +183,111 @@ def load_json(path: str):
     except Exception:
         return None
 
-def save_json(path: str, data: Any):
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
 def sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
-def csv_bytes(rows: List[List[Any]]) -> bytes:
-    buff = io.StringIO(newline="")
-    writer = csv.writer(buff, quoting=csv.QUOTE_ALL)
-    for r in rows:
-        writer.writerow(["" if x is None else str(x) for x in r])
-    return buff.getvalue().encode("utf-8")
+# Contraseñas: scrypt de OpenSSL con sal por usuario; cabe en password_hash (String(128)):
+#   scrypt$n$r$p$<sal hex>$<hash hex>
+# Los hashes viejos (sha256 hex sin sal) se siguen aceptando y se migran al entrar.
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1
+
+def hash_password(password: str) -> str:
+    salt = os.urandom(16)
+    dk = hashlib.scrypt(password.encode("utf-8"), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${dk.hex()}"
+
+def verify_password(password: str, stored: str) -> bool:
+    stored = stored or ""
+    if stored.startswith("scrypt$"):
+        try:
+            _, n, r, p, salt, dk = stored.split("$")
+            calc = hashlib.scrypt(password.encode("utf-8"), salt=bytes.fromhex(salt),
+                                  n=int(n), r=int(r), p=int(p), dklen=len(dk) // 2)
+        except (ValueError, TypeError):
+            return False
+        return hmac.compare_digest(calc.hex(), dk)
+    legacy = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    return hmac.compare_digest(legacy, stored)
+
+# Hash descartable: un usuario inexistente paga el mismo scrypt que uno real
+# (si no, el tiempo de respuesta delata qué usuarios existen). Literal fijo:
+# calcularlo al importar costaría un scrypt en cada rerun.
+_DUMMY_SCRYPT_HASH = ("scrypt$16384$8$1$9c1572a7e62f92fb951ab1715a60d532$"
+                      "1962b949f5059bac351cf3ab9419cda072eb5e3d2ae4903c5a1e259694f8dd80")
+
+def password_needs_rehash(stored: str) -> bool:
+    return not (stored or "").startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+def write_csv_rows(fh, rows: Iterable[List[Any]]):
+    # fh binario (archivo o BytesIO): se escribe fila a fila, sin StringIO intermedio
+    text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+    writer = csv.writer(text, quoting=csv.QUOTE_ALL)
+    writer.writerows(["" if x is None else str(x) for x in r] for r in rows)
+    text.detach()  # flush sin cerrar fh
+
+def csv_bytes(rows: Iterable[List[Any]]) -> bytes:
+    bio = io.BytesIO()
+    write_csv_rows(bio, rows)
+    return bio.getvalue()
+
+XLSX_COLS_LAV   = ["week","cedis","supervisor","segmento","unidadId","timestamp","created_by"]
+XLSX_COLS_NOLAV = ["week","cedis","segmento","unidadId"]
+
+# Campo del registro -> encabezado en las tablas del panel admin
+LAV_COLS   = {"cedis": "CEDIS", "supervisorNombre": "Supervisor", "segmento": "Segmento",
+              "unidadLabel": "Unidad", "ts": "Fecha", "created_by": "Capturado por"}
+NOLAV_COLS = {"cedis": "CEDIS", "segmento": "Segmento", "id": "Unidad"}
 
 def xlsx_week_bytes(week: str, lav: List[Dict[str, Any]], nolav: List[Dict[str, Any]]) -> bytes:
+    # xlsxwriter directo (sin DataFrames); constant_memory vuelca cada fila al escribirla.
+    # Ojo: no combinar con in_memory=True, que desactiva constant_memory.
+    bio = io.BytesIO()
+    wb = xlsxwriter.Workbook(bio, {"constant_memory": True})
+
+    ws = wb.add_worksheet("Lavadas")
+    ws.write_row(0, 0, XLSX_COLS_LAV)
+    for i, r in enumerate(lav or [], 1):
+        ws.write_row(i, 0, [
+            week,
+            r.get("cedis", ""),
+            r.get("supervisorNombre", ""),
+            r.get("segmento", ""),
+            r.get("unidadId") or r.get("unidadLabel", ""),
+            r.get("ts", ""),
+            r.get("created_by", ""),
+        ])
+
+    ws = wb.add_worksheet("No_lavadas")
+    ws.write_row(0, 0, XLSX_COLS_NOLAV)
+    for i, u in enumerate(nolav or [], 1):
+        ws.write_row(i, 0, [week, u.get("cedis", ""), u.get("segmento", ""), u.get("id", "")])
+
+    wb.close()
+    return bio.getvalue()
+
+def parquet_week_bytes(week: str, lav: List[Dict[str, Any]], nolav: List[Dict[str, Any]]) -> bytes:
+    # ZIP con lavadas.parquet y no_lavadas.parquet (zstd); mismas columnas que el XLSX
+    def _table(cols: List[str], rows: List[List[Any]]) -> pa.Table:
+        schema = pa.schema([(c, pa.string()) for c in cols])
+        return pa.Table.from_pylist(
+            [dict(zip(cols, ["" if x is None else str(x) for x in r])) for r in rows],
+            schema=schema,
+        )
+
+    t_lav = _table(XLSX_COLS_LAV, [[
+        week, r.get("cedis", ""), r.get("supervisorNombre", ""), r.get("segmento", ""),
+        r.get("unidadId") or r.get("unidadLabel", ""), r.get("ts", ""), r.get("created_by", ""),
+    ] for r in (lav or [])])
+    t_nolav = _table(XLSX_COLS_NOLAV, [[
+        week, u.get("cedis", ""), u.get("segmento", ""), u.get("id", ""),
+    ] for u in (nolav or [])])
+
     bio = io.BytesIO()
-    df_lav = pd.DataFrame([{
-        "week": week,
-        "cedis": r.get("cedis", ""),
-        "supervisor": r.get("supervisorNombre", ""),
-        "segmento": r.get("segmento", ""),
-        "unidadId": r.get("unidadId") or r.get("unidadLabel", ""),
-        "timestamp": r.get("ts", ""),
-        "created_by": r.get("created_by", "")
-    } for r in (lav or [])])
-
-    df_nolav = pd.DataFrame([{
-        "week": week,
-        "cedis": u.get("cedis", ""),
-        "segmento": u.get("segmento", ""),
-        "unidadId": u.get("id", "")
-    } for u in (nolav or [])])
-
-    with pd.ExcelWriter(bio, engine="xlsxwriter") as writer:
-        (df_lav if not df_lav.empty else pd.DataFrame(
-            columns=["week","cedis","supervisor","segmento","unidadId","timestamp","created_by"]
-        )).to_excel(writer, sheet_name="Lavadas", index=False)
-
-        (df_nolav if not df_nolav.empty else pd.DataFrame(
-            columns=["week","cedis","segmento","unidadId"]
-        )).to_excel(writer, sheet_name="No_lavadas", index=False)
-
-    bio.seek(0)
+    with zipfile.ZipFile(bio, "w", zipfile.ZIP_STORED) as zf:
+        for name, table in (("lavadas.parquet", t_lav), ("no_lavadas.parquet", t_nolav)):
+            buf = pa.BufferOutputStream()
+            pq.write_table(table, buf, compression="zstd")
+            zf.writestr(name, buf.getvalue().to_pybytes())
     return bio.getvalue()
 
 # ============================ Config fija =========================
@@ -232,12 +335,29 @@ CONFIG: Dict[str, Any] = {
     ]
 }
 
+# ---- Búsquedas derivadas de CONFIG (fija) ----
+@st.cache_resource(show_spinner=False)
+def config_index() -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Dict[str, Any]],
+                            Dict[str, List[Dict[str, Any]]], Dict[str, str]]:
+    # Una vez por proceso; en cada rerun es solo una búsqueda en la caché
+    cedis_labels = {c["id"]: c["nombre"] for c in CONFIG["cedis"]}
+    seg_name = {s["id"]: s["nombre"] for s in CONFIG["segmentos"]}
+    sup_by_id = {s["id"]: s for s in CONFIG["supervisores"]}
+    sup_by_cedis: Dict[str, List[Dict[str, Any]]] = {}   # norm(cedis) -> supervisores
+    for s in CONFIG["supervisores"]:
+        sup_by_cedis.setdefault(norm(s["cedis"]), []).append(s)
+    cedis_by_norm: Dict[str, str] = {}
+    for c in reversed(CONFIG["cedis"]):  # el primero en CONFIG gana, como el recorrido original
+        cedis_by_norm[norm(c["nombre"])] = c["id"]
+        cedis_by_norm[norm(c["id"])] = c["id"]
+    return cedis_labels, seg_name, sup_by_id, sup_by_cedis, cedis_by_norm
+
+# Objetos compartidos (cache_resource): solo lectura
+CEDIS_LABELS, SEG_NAME, SUP_BY_ID, SUP_BY_CEDIS, _CEDIS_BY_NORM = config_index()
+
 def cedis_id_from_any(val: str) -> str:
     key = norm(val)
-    for c in CONFIG["cedis"]:
-        if norm(c["id"]) == key or norm(c["nombre"]) == key:
-            return c["id"]
-    return key
+    return _CEDIS_BY_NORM.get(key, key)
 
 def segment_from_negocio(neg: str) -> Tuple[str, str]:
     n = norm(neg)
@@ -281,6 +401,30 @@ def load_catalog() -> List[Dict[str, Any]]:
         dedup[(u["id"], u["cedis"])] = u
     return list(dedup.values())
 
+CATALOG_COLS = ["id", "cedis", "segmento", "tipo"]
+
+@st.cache_resource(show_spinner=False)
+def catalog_index() -> Tuple[
+    List[Dict[str, Any]],
+    Dict[Tuple[str, str], Dict[str, Any]],
+    Dict[str, List[Dict[str, Any]]],
+]:
+    # (catálogo, por (id, cedis), por cedis). Solo lectura y compartido entre sesiones: no mutar
+    items = load_catalog()
+    by_key = {(u["id"], u["cedis"]): u for u in items}
+    by_cedis: Dict[str, List[Dict[str, Any]]] = {}
+    for u in items:
+        by_cedis.setdefault(u["cedis"], []).append(u)
+    return items, by_key, by_cedis
+
+@st.cache_resource(show_spinner=False)
+def catalog_frame() -> pd.DataFrame:
+    # Solo lectura y compartido entre sesiones: no mutar
+    df = pd.DataFrame(catalog_index()[0], columns=CATALOG_COLS)
+    df["id_norm"] = df["id"].map(norm)
+    df["cedis_label_norm"] = df["cedis"].map(lambda c: norm(CEDIS_LABELS.get(c, c)))
+    return df
+
 # ============================== Usuarios ============================
 
 def require_login() -> Dict[str, Any]:
@@ -299,10 +443,22 @@ def require_login() -> Dict[str, Any]:
     if st.button("Entrar"):
         u = get_user(username)  # DB
         if not u:
+            verify_password(password, _DUMMY_SCRYPT_HASH)
             st.error("Usuario o contraseña incorrectos."); st.stop()
-        pwd_ok = (u.get("sha256") == hashlib.sha256(password.encode("utf-8")).hexdigest())
+        pwd_ok = verify_password(password, u.get("sha256") or "")
         if not pwd_ok:
             st.error("Usuario o contraseña incorrectos."); st.stop()
+        if password_needs_rehash(u.get("sha256") or ""):
+            try:
+                upsert_user({
+                    "username": u["username"],
+                    "name": u.get("name"),
+                    "role": u.get("role", "supervisor"),
+                    "password_hash": hash_password(password),
+                    "supervisor_id": u.get("supervisor_id"),
+                })  # DB: migra el hash viejo a scrypt
+            except Exception:
+                pass  # el login sigue; se reintenta la próxima vez
 
         st.session_state["auth"] = {
             "ok": True,
@@ -324,12 +480,11 @@ def admin_user_manager(cedis_labels: Dict[str, str]):
 
     if users:
         st.subheader("Usuarios actuales")
-        st.dataframe({
-            "Usuario": [u.get("username","") for u in users],
-            "Nombre":  [u.get("name","") for u in users],
-            "Rol":     [u.get("role","") for u in users],
-            "Supervisor ID": [u.get("supervisor_id","") for u in users],
-        }, use_container_width=True)
+        df_users = (pd.DataFrame(users).reindex(columns=["username", "name", "role", "supervisor_id"])
+                    .fillna("")
+                    .rename(columns={"username": "Usuario", "name": "Nombre",
+                                     "role": "Rol", "supervisor_id": "Supervisor ID"}))
+        st.dataframe(df_users, use_container_width=True)
     else:
         st.info("No hay usuarios.")
 
@@ -365,7 +520,7 @@ def admin_user_manager(cedis_labels: Dict[str, str]):
                 "username": username,
                 "name": name or username,
                 "role": role,
-                "sha256": hashlib.sha256(password.encode("utf-8")).hexdigest(),
+                "password_hash": hash_password(password),
                 "supervisor_id": sup_id if role == "supervisor" else None,
             }
             upsert_user(new_user)  # DB
@@ -374,11 +529,17 @@ def admin_user_manager(cedis_labels: Dict[str, str]):
 
 # ============================= Fotos / Export ===========================
 
-def save_photo(file, subname: str, week: str, cedis: str, unidad_id: str) -> Optional[str]:
+FOTO_SLOTS: Tuple[Tuple[str, str], ...] = (
+    ("frente", "Frente"), ("atras", "Atrás"), ("lado", "Medio lado"), ("cabina", "Cabina"),
+)
+
+def evidence_dir(week: str, cedis: str, unidad_id: str) -> str:
+    return os.path.join(EVIDENCE_DIR, week, safe_slug(cedis), safe_slug(str(unidad_id)))
+
+def save_photo(file, subname: str, base: str) -> Optional[str]:
+    # base = evidence_dir(...), ya creado por quien llama (una vez por registro)
     if not file:
         return None
-    base = os.path.join(EVIDENCE_DIR, week, safe_slug(cedis), safe_slug(str(unidad_id)))
-    os.makedirs(base, exist_ok=True)
     name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}_{subname}.jpg"
     path = os.path.join(base, name)
 
@@ -395,6 +556,18 @@ def save_photo(file, subname: str, week: str, cedis: str, unidad_id: str) -> Opt
         f.write(out.getvalue())
     return path
 
+def _fast_copy(src: str, dst: str):
+    # hardlink si origen/destino están en el mismo FS; si no, copyfile (sendfile del kernel)
+    if os.path.lexists(dst):
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+        shutil.copystat(src, dst)
+
 def export_week_folders(week: str, catalog: List[Dict[str, Any]], registros_semana: List[Dict[str, Any]], only_cedis: Optional[str] = None):
     base = os.path.join(WEEKS_DIR, week)
     lav_dir = os.path.join(base, "lavados")
@@ -402,32 +575,30 @@ def export_week_folders(week: str, catalog: List[Dict[str, Any]], registros_sema
     os.makedirs(lav_dir, exist_ok=True)
     os.makedirs(nolav_dir, exist_ok=True)
 
-    registros = registros_semana[:]
+    # Solo lectura: sin copias cuando no hay filtro de CEDIS
+    registros, cat = registros_semana, catalog
     if only_cedis:
         registros = [r for r in registros if r["cedis"] == only_cedis]
         cat = [u for u in catalog if u["cedis"] == only_cedis]
-    else:
-        cat = catalog[:]
 
     lavadas_set = {(r["cedis"], r["unidadId"]) for r in registros}
+    nolav_cat = [u for u in cat if (u["cedis"], u["id"]) not in lavadas_set]
 
-    for r in registros:
+    def _emit_lavado(r: Dict[str, Any]):
         cedis = r["cedis"]; unidad = r["unidadId"]
-        src_dir = os.path.join(EVIDENCE_DIR, week, safe_slug(cedis), safe_slug(unidad))
+        src_dir = evidence_dir(week, cedis, unidad)
         dst_dir = os.path.join(lav_dir, cedis, unidad)
-        os.makedirs(dst_dir, exist_ok=True)
         if os.path.isdir(src_dir):
             for name in os.listdir(src_dir):
                 src = os.path.join(src_dir, name)
                 if os.path.isfile(src):
-                    shutil.copy2(src, os.path.join(dst_dir, name))
-        save_json(os.path.join(dst_dir, "record.json"), r)
+                    _fast_copy(src, os.path.join(dst_dir, name))
+        # JSON compacto; dst_dir ya existe (ver `wanted`)
+        with open(os.path.join(dst_dir, "record.json"), "w", encoding="utf-8") as f:
+            json.dump(r, f, ensure_ascii=False, separators=(",", ":"))
 
-    for u in cat:
-        if (u["cedis"], u["id"]) in lavadas_set:
-            continue
+    def _emit_no_lavado(u: Dict[str, Any]):
         dst = os.path.join(nolav_dir, u["cedis"], u["id"])
-        os.makedirs(dst, exist_ok=True)
         with open(os.path.join(dst, "README.txt"), "w", encoding="utf-8") as f:
             f.write(
                 f"Unidad NO lavada en {week}\n"
@@ -436,27 +607,120 @@ def export_week_folders(week: str, catalog: List[Dict[str, Any]], registros_sema
                 f"Generado: {datetime.now().isoformat(timespec='seconds')}\n"
             )
 
-    rows = [["week","estado","cedis","segmento","unidadId","supervisor","timestamp"]]
-    for r in registros:
-        rows.append([week, "lavado", r["cedis"], r["segmento"], r["unidadId"], r.get("supervisorNombre",""), r["ts"]])
-    for u in cat:
-        if (u["cedis"], u["id"]) not in lavadas_set:
-            rows.append([week, "no_lavado", u["cedis"], u["segmento"], u["id"], "", ""])
+    # Directorios únicos creados una sola vez (no un makedirs por registro)
+    wanted = {os.path.join(lav_dir, r["cedis"], r["unidadId"]) for r in registros}
+    wanted |= {os.path.join(nolav_dir, u["cedis"], u["id"]) for u in nolav_cat}
+    for d in wanted:
+        os.makedirs(d, exist_ok=True)
+
+    # Solo I/O (syscalls que sueltan el GIL): se reparte en hilos.
+    # list(map) propaga la primera excepción de cualquier hilo.
+    with ThreadPoolExecutor(max_workers=min(EXPORT_WORKERS, len(registros) or 1)) as ex:
+        list(ex.map(_emit_lavado, registros))
+    with ThreadPoolExecutor(max_workers=min(EXPORT_WORKERS, len(nolav_cat) or 1)) as ex:
+        list(ex.map(_emit_no_lavado, nolav_cat))
+
+    def _resumen_rows():
+        yield ["week","estado","cedis","segmento","unidadId","supervisor","timestamp"]
+        for r in registros:
+            yield [week, "lavado", r["cedis"], r["segmento"], r["unidadId"], r.get("supervisorNombre",""), r["ts"]]
+        for u in nolav_cat:
+            yield [week, "no_lavado", u["cedis"], u["segmento"], u["id"], "", ""]
 
     with open(os.path.join(base, "resumen.csv"), "wb") as f:
-        f.write(csv_bytes(rows))
+        write_csv_rows(f, _resumen_rows())
 
 def delete_week_everywhere(week: str, registros_semana: List[Dict[str, Any]]):
-    for r in registros_semana:
-        try:
-            delete_lavado(r["id"])
-        except Exception:
-            pass
+    try:
+        delete_lavados(r["id"] for r in registros_semana)
+    except Exception:
+        pass
+    lavados_changed()
     shutil.rmtree(os.path.join(EVIDENCE_DIR, week), ignore_errors=True)
     shutil.rmtree(os.path.join(WEEKS_DIR, week), ignore_errors=True)
 
 # ============================ Reportes & Gráficos ========================
 
+def _rows_digest(rows: List[Dict[str, Any]], keys: Tuple[str, ...]) -> str:
+    # huella de solo las columnas que usan los KPIs (clave barata para la caché)
+    h = hashlib.sha1()
+    for r in rows or []:
+        h.update("\x1f".join(str(r.get(k, "")) for k in keys).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+_KPI_CAT_KEYS = ("id", "cedis", "segmento")
+_KPI_REG_KEYS = ("unidadId", "cedis", "supervisorId", "supervisorNombre")
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _kpis_data(
+    cat_digest: str,
+    reg_digest: str,
+    sup_by_id: Dict[str, Dict[str, Any]],
+    cedis_filtro: Optional[str],
+    _CATALOGO: List[Dict[str, Any]],
+    _reg_semana: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    # _CATALOGO/_reg_semana no se hashean: la clave son sus digests
+    df_cat = pd.DataFrame(_CATALOGO or [], columns=list(_KPI_CAT_KEYS))
+    df_reg = pd.DataFrame(_reg_semana or [])
+    for col in _KPI_REG_KEYS:
+        if col not in df_reg.columns:
+            df_reg[col] = None
+
+    if cedis_filtro:
+        df_cat = df_cat[df_cat["cedis"] == cedis_filtro]
+        df_reg = df_reg[df_reg["cedis"] == cedis_filtro]
+
+    cat_u = df_cat.drop_duplicates(["id", "cedis"])
+    total_unidades = len(cat_u)
+    total_lavadas = len(df_reg.drop_duplicates(["unidadId", "cedis"]))
+
+    df_cedis = (
+        df_reg.groupby("cedis", dropna=False).size().reset_index(name="lavadas")
+        .sort_values("lavadas", ascending=False)
+    )
+
+    df_sup = (
+        pd.DataFrame({"Supervisor": df_reg["supervisorNombre"].fillna("(sin supervisor)")})
+        .groupby("Supervisor", dropna=False)
+        .size()
+        .reset_index(name="lavadas")
+        .sort_values("lavadas", ascending=False)
+    )
+
+    # Faltantes: esperadas por (cedis, segmento) o por cedis si el supervisor no tiene segmento
+    sup_df = pd.DataFrame([{
+        "sid": sid,
+        "Supervisor": sup.get("nombre", sid),
+        "cedis": sup.get("cedis", ""),
+        "segmento": sup.get("segmento") or "",
+    } for sid, sup in sup_by_id.items() if isinstance(sup, dict)],
+        columns=["sid", "Supervisor", "cedis", "segmento"])
+    esp_cedis = sup_df["cedis"].map(cat_u.groupby("cedis").size())
+    esp_seg = pd.Series(
+        pd.MultiIndex.from_frame(sup_df[["cedis", "segmento"]]).map(
+            cat_u.groupby(["cedis", "segmento"]).size().to_dict()
+        ),
+        index=sup_df.index,
+        dtype="float",
+    )
+    sup_df["Esperadas"] = esp_seg.where(sup_df["segmento"] != "", esp_cedis).fillna(0).astype(int)
+    sup_df["Lavadas"] = sup_df["sid"].map(df_reg.groupby("supervisorId").size()).fillna(0).astype(int)
+    sup_df["Faltantes"] = (sup_df["Esperadas"] - sup_df["Lavadas"]).clip(lower=0)
+    df_falt = (
+        sup_df[["Supervisor", "Esperadas", "Lavadas", "Faltantes"]]
+        .sort_values("Faltantes", ascending=False)
+    )
+
+    return {
+        "total_unidades": total_unidades,
+        "total_lavadas": total_lavadas,
+        "df_cedis": df_cedis,
+        "df_sup": df_sup,
+        "df_falt": df_falt,
+    }
+
 def kpis_y_graficos(
     CATALOGO: List[Dict[str, Any]],
     reg_semana: List[Dict[str, Any]],
@@ -467,25 +731,16 @@ def kpis_y_graficos(
 ):
     st.subheader("Reportes y Gráficos")
 
-    df_cat = pd.DataFrame(CATALOGO or [])
-    df_reg = pd.DataFrame(reg_semana or [])
-
-    if cedis_filtro:
-        if not df_cat.empty and "cedis" in df_cat:
-            df_cat = df_cat[df_cat["cedis"] == cedis_filtro]
-        if not df_reg.empty and "cedis" in df_reg:
-            df_reg = df_reg[df_reg["cedis"] == cedis_filtro]
-
-    if df_cat.empty or not set(["id","cedis"]).issubset(df_cat.columns):
-        total_unidades = 0
-    else:
-        total_unidades = df_cat[["id","cedis"]].drop_duplicates().shape[0]
-
-    if df_reg.empty or not set(["unidadId","cedis"]).issubset(df_reg.columns):
-        total_lavadas = 0
-    else:
-        total_lavadas = df_reg[["unidadId","cedis"]].drop_duplicates().shape[0]
-
+    data = _kpis_data(
+        _rows_digest(CATALOGO, _KPI_CAT_KEYS),
+        _rows_digest(reg_semana, _KPI_REG_KEYS),
+        sup_by_id,
+        cedis_filtro,
+        CATALOGO,
+        reg_semana,
+    )
+    total_unidades = data["total_unidades"]
+    total_lavadas = data["total_lavadas"]
     total_no_lav = max(total_unidades - total_lavadas, 0)
     pct = (total_lavadas / total_unidades * 100.0) if total_unidades else 0.0
 
@@ -497,14 +752,10 @@ def kpis_y_graficos(
 
     st.markdown("**Lavadas por CEDIS**")
     try:
-        if not df_reg.empty and "cedis" in df_reg.columns:
-            df_cedis = df_reg.groupby("cedis", dropna=False).size().reset_index(name="lavadas")
-            if not df_cedis.empty:
-                df_cedis["CEDIS"] = df_cedis["cedis"].map(lambda x: cedis_labels.get(x, x))
-                df_cedis = df_cedis.sort_values("lavadas", ascending=False)
-                st.bar_chart(df_cedis.set_index("CEDIS")["lavadas"], use_container_width=True)
-            else:
-                st.info("Sin lavados registrados para el filtro seleccionado.")
+        df_cedis = data["df_cedis"]
+        if not df_cedis.empty:
+            df_cedis["CEDIS"] = df_cedis["cedis"].map(lambda x: cedis_labels.get(x, x))
+            st.bar_chart(df_cedis.set_index("CEDIS")["lavadas"], use_container_width=True)
         else:
             st.info("Sin lavados registrados para el filtro seleccionado.")
     except Exception as e:
@@ -512,21 +763,9 @@ def kpis_y_graficos(
 
     st.markdown("**Lavadas por Supervisor**")
     try:
-        if not df_reg.empty:
-            sup_series = df_reg.get("supervisorNombre")
-            if sup_series is None:
-                sup_series = pd.Series(["(sin supervisor)"] * len(df_reg))
-            df_sup = (
-                pd.DataFrame({"Supervisor": sup_series.fillna("(sin supervisor)")})
-                .groupby("Supervisor", dropna=False)
-                .size()
-                .reset_index(name="lavadas")
-                .sort_values("lavadas", ascending=False)
-            )
-            if not df_sup.empty:
-                st.bar_chart(df_sup.set_index("Supervisor")["lavadas"], use_container_width=True)
-            else:
-                st.info("Sin lavados por supervisor para el filtro seleccionado.")
+        df_sup = data["df_sup"]
+        if not df_sup.empty:
+            st.bar_chart(df_sup.set_index("Supervisor")["lavadas"], use_container_width=True)
         else:
             st.info("Sin lavados por supervisor para el filtro seleccionado.")
     except Exception as e:
@@ -534,42 +773,8 @@ def kpis_y_graficos(
 
     st.markdown("**Faltantes estimados por Supervisor**")
     try:
-        filas = []
-
-        if df_cat.empty or "cedis" not in df_cat.columns or "segmento" not in df_cat.columns:
-            df_cat_filtrado = pd.DataFrame(columns=["id","cedis","segmento"])
-        else:
-            df_cat_filtrado = df_cat[["id","cedis","segmento"]].copy()
-
-        for sid, sup in sup_by_id.items():
-            if not isinstance(sup, dict):
-                continue
-            sup_cedis = sup.get("cedis", "")
-            sup_seg   = sup.get("segmento")
-            sup_name  = sup.get("nombre", sid)
-
-            cat_sup = df_cat_filtrado[df_cat_filtrado["cedis"] == sup_cedis] if not df_cat_filtrado.empty else pd.DataFrame(columns=["id","cedis","segmento"])
-            if sup_seg and not cat_sup.empty:
-                cat_sup = cat_sup[cat_sup["segmento"] == sup_seg]
-
-            total_esp = cat_sup[["id","cedis"]].drop_duplicates().shape[0] if not cat_sup.empty else 0
-
-            if not df_reg.empty and "supervisorId" in df_reg.columns:
-                lavadas_sup = df_reg[df_reg["supervisorId"] == sid].shape[0]
-            else:
-                lavadas_sup = 0
-
-            faltantes = max(total_esp - lavadas_sup, 0)
-            filas.append({
-                "Supervisor": sup_name,
-                "Esperadas": int(total_esp),
-                "Lavadas": int(lavadas_sup),
-                "Faltantes": int(faltantes),
-            })
-
-        df_falt = pd.DataFrame(filas)
+        df_falt = data["df_falt"]
         if not df_falt.empty:
-            df_falt = df_falt.sort_values("Faltantes", ascending=False)
             st.dataframe(df_falt, use_container_width=True)
             st.bar_chart(df_falt.set_index("Supervisor")["Faltantes"], use_container_width=True)
         else:
@@ -579,9 +784,15 @@ def kpis_y_graficos(
 
 # =============================== App ===============================
 
+@st.cache_resource(show_spinner=False)
+def _startup() -> Tuple[bool, str]:
+    # Una vez por proceso (no en cada rerun): carpetas, tablas y ping a la BD
+    ensure_dirs()
+    init_db()
+    return healthcheck()
+
 def main():
     keep_alive()
-    ensure_dirs()
     inject_css()
 
     # contador para resetear form
@@ -589,14 +800,16 @@ def main():
         st.session_state["form_registro_version"] = 0
 
     # Conectar BD
-    init_db()
-    ok, msg = healthcheck()
+    ok, msg = _startup()
     with st.sidebar:
         st.subheader("Estado BD")
         if ok:
             st.success(f"✅ {msg}")
         else:
             st.error(f"❌ {msg}")
+            if st.button("Reintentar"):
+                _startup.clear()
+                st.rerun()
 
     # Header visual
     st.markdown(
@@ -613,9 +826,9 @@ def main():
     )
 
     auth = require_login()
-    CATALOGO = load_catalog()
-    cedis_labels = {c["id"]: c["nombre"] for c in CONFIG["cedis"]}
-    sup_by_id = {s["id"]: s for s in CONFIG["supervisores"]}
+    CATALOGO, CATALOGO_BY_KEY, CATALOGO_BY_CEDIS = catalog_index()
+    cedis_labels = CEDIS_LABELS
+    sup_by_id = SUP_BY_ID
 
     colH1, colH2 = st.columns([6,1])
     with colH1:
@@ -644,18 +857,17 @@ def main():
                 CEDIS = st.selectbox("Departamento (CEDIS)", options=cedis_options, index=0,
                                      format_func=lambda x: cedis_labels.get(x, x))
             with cC:
-                sup_list = [s for s in CONFIG["supervisores"] if norm(s["cedis"]) == norm(CEDIS)]
-                sup_map = {s["id"]: s for s in sup_list}
+                sup_list = SUP_BY_CEDIS.get(norm(CEDIS), [])
                 SUP = st.selectbox(
                     "Supervisor (para estadísticas)",
                     options=[""] + [s["id"] for s in sup_list],
-                    format_func=lambda x: (sup_map.get(x, {}) or {}).get("nombre", "— Elegir supervisor —"),
+                    format_func=lambda x: (SUP_BY_ID.get(x, {}) or {}).get("nombre", "— Elegir supervisor —"),
                 )
 
         with cD:
             seg_ids = ["all"] + [s["id"] for s in CONFIG["segmentos"]]
-            seg_labels = {"all":"Todos", **{s["id"]: s["nombre"] for s in CONFIG["segmentos"]}}
-            SEG = st.radio("Segmento", options=seg_ids, format_func=lambda x: seg_labels[x], horizontal=True)
+            SEG = st.radio("Segmento", options=seg_ids,
+                           format_func=lambda x: "Todos" if x=="all" else SEG_NAME.get(x, x), horizontal=True)
 
     sup_seg = (sup_by_id.get(SUP) or {}).get("segmento")
 
@@ -664,9 +876,9 @@ def main():
             return []
         asignadas_ids = {a["unidadId"] for a in CONFIG["asignaciones"] if a["supervisorId"] == SUP}
         if asignadas_ids:
-            pool = [u for u in CATALOGO if u["cedis"] == CEDIS and u["id"] in asignadas_ids]
+            pool = [u for u in CATALOGO_BY_CEDIS.get(CEDIS, []) if u["id"] in asignadas_ids]
         else:
-            pool = [u for u in CATALOGO if u["cedis"] == CEDIS]
+            pool = CATALOGO_BY_CEDIS.get(CEDIS, [])
             if sup_seg:
                 pool = [u for u in pool if u["segmento"] == sup_seg]
         if SEG != "all":
@@ -677,7 +889,6 @@ def main():
 
     # -------- Formulario de captura (solo supervisor) --------
     st.subheader("Registrar lavado")
-    FOTO_SLOTS = [("frente","Frente"),("atras","Atrás"),("lado","Medio lado"),("cabina","Cabina")]
 
     if auth["role"] != "supervisor":
         st.info("El administrador no puede registrar ni modificar lavados. Solo consulta y exporta estadísticas.", icon="🔒")
@@ -694,20 +905,20 @@ def main():
             )
 
             cols = st.columns(4)
-            uploads: Dict[str, Any] = {}
-            for (key, label), c in zip(FOTO_SLOTS, cols):
-                with c:
-                    uploads[key] = st.file_uploader(
-                        f"Foto: {label}",
-                        type=["jpg","jpeg","png","webp"],
-                        key=f"u_{key}_v{version}",
-                    )
+            uploads: Dict[str, Any] = {
+                key: c.file_uploader(
+                    f"Foto: {label}",
+                    type=["jpg","jpeg","png","webp"],
+                    key=f"u_{key}_v{version}",
+                )
+                for (key, label), c in zip(FOTO_SLOTS, cols)
+            }
 
             submitted = st.form_submit_button("Guardar")
             if submitted:
                 if not unidad:
                     st.warning("Elegí la unidad.", icon="⚠️")
-                elif any(uploads[k] is None for k, _ in FOTO_SLOTS):
+                elif not all(uploads.get(k) for k, _ in FOTO_SLOTS):
                     st.warning("Subí las 4 fotos: Frente, Atrás, Medio lado y Cabina.", icon="⚠️")
                 else:
                     hashes_local: Dict[str, str] = {}
@@ -724,16 +935,18 @@ def main():
                         st.error("No podés subir la misma foto en dos posiciones distintas.", icon="🚫")
                         st.stop()
 
-                    all_hashes = photo_hashes_all()
-                    repetidas = [k for k,h in hashes_local.items() if h in all_hashes]
+                    hits = photo_hashes_exist(list(hashes_local.values()))
+                    repetidas = [k for k,h in hashes_local.items() if h in hits]
                     if repetidas:
                         st.error(f"Estas fotos ya se usaron antes: {', '.join(repetidas)}.", icon="🚫")
                         st.stop()
 
                     with st.spinner("Guardando fotos y registrando..."):
-                        fotos_paths = {k: save_photo(uploads[k], k, WEEK, CEDIS, unidad) for k,_ in FOTO_SLOTS}
+                        ev_dir = evidence_dir(WEEK, CEDIS, unidad)
+                        os.makedirs(ev_dir, exist_ok=True)
+                        fotos_paths = {k: save_photo(uploads[k], k, ev_dir) for k,_ in FOTO_SLOTS}
 
-                        u = next((x for x in CATALOGO if x["id"] == unidad and x["cedis"] == CEDIS), None)
+                        u = CATALOGO_BY_KEY.get((unidad, CEDIS))
                         record = {
                             "id": uuid.uuid4().hex,
                             "week": WEEK,
@@ -749,6 +962,7 @@ def main():
                             "created_by": auth["username"],
                         }
                         save_lavado(record)
+                        lavados_changed()
 
                     st.session_state["lavado_guardado_ok"] = True
                     st.session_state["lavado_semana_actual"] = WEEK
@@ -771,33 +985,58 @@ def main():
     # -------- Tabla de registros --------
     WEEK_CUR = iso_week_key(fecha_sel)
     st.subheader(f"Registros — {WEEK_CUR}")
-    reg_semana = get_lavados_week(WEEK_CUR)
+    reg_semana = lavados_semana(WEEK_CUR)
+    # Índice por supervisor en una pasada; el supervisor trabaja solo con su porción
+    reg_by_sup: Dict[Optional[str], List[Dict[str, Any]]] = defaultdict(list)
+    for r in reg_semana:
+        reg_by_sup[r["supervisorId"]].append(r)
     if auth["role"] == "supervisor":
-        reg_semana = [r for r in reg_semana if r["supervisorId"] == auth.get("supervisorId")]
+        # Sin supervisor_id no hay porción propia (la de None son registros de nadie), igual que en los KPIs
+        reg_semana = reg_by_sup.get(auth["supervisorId"], []) if auth.get("supervisorId") else []
 
     if not reg_semana:
         st.write("Sin registros para esta semana.")
     else:
-        for r in sorted(reg_semana, key=lambda x: x["ts"], reverse=True):
-            cols = st.columns([1,1,0.8,1,2.2,0.9,0.6])
-            cols[0].write(cedis_labels.get(r["cedis"], r["cedis"]))
-            cols[1].write(r.get("supervisorNombre",""))
-            cols[2].write(r.get("segmento",""))
-            cols[3].write(r.get("unidadLabel",""))
-            gcols = cols[4].columns(4)
-            for i,(k,_) in enumerate(FOTO_SLOTS):
-                p = (r.get("fotos") or {}).get(k)
-                if p and os.path.exists(p):
-                    show_image(gcols[i], p)
-                else:
-                    gcols[i].write("—")
-            cols[5].write(r["ts"])
-            can_delete = auth["role"] == "supervisor" and r["supervisorId"] == auth.get("supervisorId")
-            if can_delete and cols[6].button("Eliminar", key=r["id"]):
-                delete_lavado(r["id"])
+        filas = []
+        for r in reg_semana:  # ya viene ORDER BY ts DESC desde la BD
+            fotos = r.get("fotos") or {}
+            hashes = r.get("foto_hashes") or {}
+            fila = {
+                "id": r["id"],
+                "CEDIS": cedis_labels.get(r["cedis"], r["cedis"]),
+                "Supervisor": r.get("supervisorNombre",""),
+                "Segmento": r.get("segmento",""),
+                "Unidad": r.get("unidadLabel",""),
+            }
+            for k, label in FOTO_SLOTS:
+                p = fotos.get(k)
+                fila[label] = photo_thumb_uri(hashes.get(k) or p, p) if p else None
+            fila["Fecha"] = r["ts"]
+            filas.append(fila)
+        df_regs = pd.DataFrame(filas).set_index("id")
+        fotos_cfg = {label: st.column_config.ImageColumn(label, width="small") for _, label in FOTO_SLOTS}
+
+        if auth["role"] == "supervisor":
+            # reg_semana ya viene filtrado a sus registros: todos se pueden eliminar
+            df_regs["Eliminar"] = False
+            editor_v = st.session_state.setdefault("reg_editor_version", 0)
+            edited = st.data_editor(
+                df_regs,
+                column_config={**fotos_cfg, "Eliminar": st.column_config.CheckboxColumn("Eliminar")},
+                disabled=[c for c in df_regs.columns if c != "Eliminar"],
+                hide_index=True,
+                use_container_width=True,
+                key=f"reg_editor_{WEEK_CUR}_v{editor_v}",
+            )
+            a_borrar = edited.index[edited["Eliminar"]].tolist()
+            if a_borrar and st.button(f"Eliminar seleccionados ({len(a_borrar)})"):
+                delete_lavados(a_borrar)
+                lavados_changed()
+                # keys nuevas: las marcas del editor no deben caer sobre otras filas
+                st.session_state["reg_editor_version"] += 1
                 st.rerun()
-            if not can_delete:
-                cols[6].write("—")
+        else:
+            st.dataframe(df_regs, column_config=fotos_cfg, hide_index=True, use_container_width=True)
 
     # -------- No lavadas --------
     st.subheader(f"Unidades NO lavadas — {WEEK_CUR}")
@@ -807,7 +1046,7 @@ def main():
         CEDIS_RES = CEDIS
 
     lavadas_set = {(r["unidadId"], r["cedis"]) for r in reg_semana}
-    faltantes = [u for u in CATALOGO if (u["id"], u["cedis"]) not in lavadas_set and u["cedis"] == CEDIS_RES]
+    faltantes = [u for u in CATALOGO_BY_CEDIS.get(CEDIS_RES, []) if (u["id"], u["cedis"]) not in lavadas_set]
 
     tabs = st.tabs([s["nombre"] for s in CONFIG["segmentos"]])
     for i, seg in enumerate(CONFIG["segmentos"]):
@@ -815,10 +1054,9 @@ def main():
             data = [u for u in faltantes if u["segmento"] == seg["id"]]
             st.write(f"Total: {len(data)}")
             if data:
-                st.dataframe({
-                    "Unidad": [u["id"] for u in data],
-                    "Segmento": [u["segmento"] for u in data]
-                }, use_container_width=True)
+                st.dataframe(pd.DataFrame(data, columns=["id", "segmento"])
+                             .rename(columns={"id": "Unidad", "segmento": "Segmento"}),
+                             use_container_width=True)
             else:
                 st.success("¡Al día!")
 
@@ -838,81 +1076,98 @@ def main():
             admin_seg = st.selectbox(
                 "Segmento",
                 options=["all"] + [s["id"] for s in CONFIG["segmentos"]],
-                format_func=lambda x: "Todos" if x=="all" else next(s["nombre"] for s in CONFIG["segmentos"] if s["id"]==x),
+                format_func=lambda x: "Todos" if x=="all" else SEG_NAME.get(x, x),
             )
         with c3:
-            sup_all = CONFIG["supervisores"] if admin_cedis=="all" else [s for s in CONFIG["supervisores"] if norm(s["cedis"])==norm(admin_cedis)]
-            sup_map_all = {s["id"]: s for s in sup_all}
+            sup_all = CONFIG["supervisores"] if admin_cedis=="all" else SUP_BY_CEDIS.get(norm(admin_cedis), [])
             admin_sup = st.selectbox(
                 "Supervisor",
                 options=["all"] + [s["id"] for s in sup_all],
-                format_func=lambda x: "Todos" if x=="all" else sup_map_all.get(x,{}).get("nombre",""),
+                format_func=lambda x: "Todos" if x=="all" else SUP_BY_ID.get(x,{}).get("nombre",""),
             )
         with c4:
             admin_q = st.text_input("Buscar (unidad o supervisor)")
 
-        pool = CATALOGO[:]
-        if admin_cedis!="all": pool = [u for u in pool if u["cedis"] == admin_cedis]
-        if admin_seg!="all":   pool = [u for u in pool if u["segmento"] == admin_seg]
+        cat_df = catalog_frame()
+        mask = np.ones(len(cat_df), dtype=bool)
+        if admin_cedis!="all": mask &= cat_df["cedis"].eq(admin_cedis).to_numpy()
+        if admin_seg!="all":   mask &= cat_df["segmento"].eq(admin_seg).to_numpy()
         if admin_sup!="all":
             ids_asig = {a["unidadId"] for a in CONFIG["asignaciones"] if a["supervisorId"] == admin_sup}
-            if ids_asig: pool = [u for u in pool if u["id"] in ids_asig]
+            if ids_asig: mask &= cat_df["id"].isin(ids_asig).to_numpy()
         if admin_q.strip():
             q = norm(admin_q)
-            pool = [u for u in pool if q in norm(u["id"]) or q in norm(cedis_labels.get(u["cedis"], u["cedis"]))]
-
-        lav = get_lavados_week(WEEK_CUR)
-        if admin_cedis!="all": lav = [r for r in lav if r["cedis"] == admin_cedis]
-        if admin_seg!="all":   lav = [r for r in lav if r["segmento"] == admin_seg]
-        if admin_sup!="all":   lav = [r for r in lav if r["supervisorId"] == admin_sup]
+            mask &= (cat_df["id_norm"].str.contains(q, regex=False)
+                     | cat_df["cedis_label_norm"].str.contains(q, regex=False)).to_numpy()
+        pool = cat_df.loc[mask, CATALOG_COLS].to_dict("records")
+
+        # Filtros exactos en SQL; el texto libre sigue en Python porque norm() ignora acentos
+        # en cualquier motor (LIKE en SQLite no)
+        lav = lavados_semana_filtrada(
+            WEEK_CUR,
+            None if admin_cedis=="all" else admin_cedis,
+            None if admin_seg=="all" else admin_seg,
+            None if admin_sup=="all" else admin_sup,
+        )
         if admin_q.strip():
             q = norm(admin_q)
-            lav = [r for r in lav if q in norm(r["unidadLabel"]) or q in norm(r["supervisorNombre"])]
+            hay = lavados_busqueda(
+                WEEK_CUR,
+                None if admin_cedis=="all" else admin_cedis,
+                None if admin_seg=="all" else admin_seg,
+                None if admin_sup=="all" else admin_sup,
+            )
+            lav = [r for r in lav if q in (hay.get(r["id"]) or lavado_texto(r))]
 
-        nolav = [u for u in pool if (u["id"], u["cedis"]) not in {(r["unidadId"], r["cedis"]) for r in lav}]
+        lav_keys = {(r["unidadId"], r["cedis"]) for r in lav}
+        pool_by_key = {(u["id"], u["cedis"]): u for u in pool}
+        nolav = [u for k, u in pool_by_key.items() if k not in lav_keys]
 
         xlsx_data = xlsx_week_bytes(WEEK_CUR, lav, nolav)
-        st.download_button(
-            "Descargar XLSX (lavadas / no lavadas)",
-            data=xlsx_data,
-            file_name=f"reporte-{WEEK_CUR}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        cX1, cX2 = st.columns(2)
+        with cX1:
+            st.download_button(
+                "Descargar XLSX (lavadas / no lavadas)",
+                data=xlsx_data,
+                file_name=f"reporte-{WEEK_CUR}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        with cX2:
+            st.download_button(
+                "Descargar Parquet (ZIP lavadas / no lavadas)",
+                data=parquet_week_bytes(WEEK_CUR, lav, nolav),
+                file_name=f"reporte-{WEEK_CUR}-parquet.zip",
+                mime="application/zip"
+            )
 
         cA, cB = st.columns(2)
         with cA:
             st.subheader("Lavadas (filtros)")
             st.write(f"Total: {len(lav)}")
             if lav:
-                st.dataframe({
-                    "CEDIS": [cedis_labels.get(r["cedis"], r["cedis"]) for r in lav],
-                    "Supervisor": [r["supervisorNombre"] for r in lav],
-                    "Segmento": [r["segmento"] for r in lav],
-                    "Unidad": [r["unidadLabel"] for r in lav],
-                    "Fecha": [r["ts"] for r in lav],
-                    "Capturado por": [r.get("created_by","") for r in lav],
-                }, use_container_width=True)
-            csv_lav = csv_bytes(
-                [["week","cedis","supervisor","segmento","unidadId","timestamp","created_by"], *[[   
-                    WEEK_CUR, r["cedis"], r["supervisorNombre"], r["segmento"], r["unidadLabel"], r["ts"], r.get("created_by","")
-                ] for r in lav]]
-            )
+                # Un solo DataFrame (columnas en una pasada) en vez de una comprensión por columna
+                df_lav = pd.DataFrame(lav).reindex(columns=list(LAV_COLS)).rename(columns=LAV_COLS)
+                df_lav["CEDIS"] = df_lav["CEDIS"].map(cedis_labels).fillna(df_lav["CEDIS"])
+                df_lav["Capturado por"] = df_lav["Capturado por"].fillna("")
+                st.dataframe(df_lav, use_container_width=True)
+            csv_lav = csv_bytes(chain(
+                [["week","cedis","supervisor","segmento","unidadId","timestamp","created_by"]],
+                ([WEEK_CUR, r["cedis"], r["supervisorNombre"], r["segmento"], r["unidadLabel"], r["ts"], r.get("created_by","")]
+                 for r in lav),
+            ))
             st.download_button("Exportar LAVADAS (CSV)", data=csv_lav, file_name=f"lavadas-{WEEK_CUR}.csv", mime="text/csv")
 
         with cB:
             st.subheader("No lavadas (filtros)")
             st.write(f"Total: {len(nolav)}")
             if nolav:
-                st.dataframe({
-                    "CEDIS": [cedis_labels.get(u["cedis"], u["cedis"]) for u in nolav],
-                    "Segmento": [u["segmento"] for u in nolav],
-                    "Unidad": [u["id"] for u in nolav],
-                }, use_container_width=True)
-            csv_nolav = csv_bytes(
-                [["week","cedis","segmento","unidadId"], *[[   
-                    WEEK_CUR, u["cedis"], u["segmento"], u["id"]
-                ] for u in nolav]]
-            )
+                df_nolav = pd.DataFrame(nolav, columns=list(NOLAV_COLS)).rename(columns=NOLAV_COLS)
+                df_nolav["CEDIS"] = df_nolav["CEDIS"].map(cedis_labels).fillna(df_nolav["CEDIS"])
+                st.dataframe(df_nolav, use_container_width=True)
+            csv_nolav = csv_bytes(chain(
+                [["week","cedis","segmento","unidadId"]],
+                ([WEEK_CUR, u["cedis"], u["segmento"], u["id"]] for u in nolav),
+            ))
             st.download_button("Exportar NO LAVADAS (CSV)", data=csv_nolav, file_name=f"no-lavadas-{WEEK_CUR}.csv", mime="text/csv")
 
         st.markdown("---")
@@ -933,16 +1188,22 @@ def main():
 
     st.markdown("---")
     st.header("Reportes y Gráficos")
-    cedis_opc = ["(Todos)"] + sorted({u["cedis"] for u in CATALOGO})
+    cedis_opc = ["(Todos)"] + sorted(CATALOGO_BY_CEDIS)
     cedis_sel = st.selectbox(
         "Filtrar gráficos por CEDIS",
         options=cedis_opc,
         format_func=lambda x: "Todos" if x == "(Todos)" else cedis_labels.get(x, x),
     )
     cedis_filter = None if cedis_sel == "(Todos)" else cedis_sel
+    if auth["role"] != "supervisor":
+        reg_kpis = lavados_semana_lite(WEEK_CUR)
+    elif auth.get("supervisorId"):
+        reg_kpis = lavados_semana_lite(WEEK_CUR, auth["supervisorId"])
+    else:
+        reg_kpis = []  # supervisor sin supervisor_id: None sería "sin filtro" (datos de todos)
     kpis_y_graficos(
         CATALOGO=CATALOGO,
-        reg_semana=reg_semana,
+        reg_semana=reg_kpis,
         sup_by_id=sup_by_id,
         cedis_labels=cedis_labels,
         week_key=WEEK_CUR,
@@ -951,4 +1212,5 @@ def main():
 
 # ---- run ----
 if __name__ == "__main__":
-    boot_guard(main)
+    with session_scope():  # una conexión de BD para todo el rerun
+        boot_guard(main)
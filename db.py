@@ -3,14 +3,26 @@
 # SQLAlchemy==2.0.43
 # PyMySQL==1.1.0
 
-import os, json, datetime, time
-from typing import Any, Dict, List, Optional, Set, Tuple
+import os, json, datetime, time, threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
+try:
+    import orjson  # C, bastante más rápido que json para fotos/hashes
+except ImportError:
+    orjson = None
+
+from cachetools import TTLCache
 from sqlalchemy import (
-    create_engine, text, select, delete,
-    String, DateTime, Text, UniqueConstraint
+    create_engine, text, select, insert, delete, tuple_, lambda_stmt,
+    String, DateTime, Text, ForeignKey, UniqueConstraint, Index
 )
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column, sessionmaker
 from sqlalchemy.exc import OperationalError
 
 # ---------- URL de BD ----------
@@ -19,27 +31,35 @@ DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 if DATABASE_URL.startswith("mysql://"):
     DATABASE_URL = DATABASE_URL.replace("mysql://", "mysql+pymysql://", 1)
 
-# Fallback local
+# Fallback local (la carpeta se crea al abrir el engine, no al importar)
 if not DATABASE_URL:
-    os.makedirs("store", exist_ok=True)
     DATABASE_URL = "sqlite:///store/app.db"
 
 USE_SSL = os.getenv("DB_SSL", "0") == "1"
 
-def _engine_kwargs() -> dict:
+def _engine_kwargs(database_url: str = DATABASE_URL) -> dict:
     kwargs = dict(
         future=True,
         pool_pre_ping=True,   # evita conexiones muertas
         pool_recycle=280,     # recicla antes de que Railway corte (~5 min)
-        pool_size=5,
-        max_overflow=10,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
         pool_timeout=30,
+        pool_use_lifo=True,   # reutiliza la conexión más reciente (caliente); las ociosas se reciclan
+        # executemany de INSERT -> un INSERT multi-VALUES por cada 1000 filas
+        insertmanyvalues_page_size=1000,
+        query_cache_size=1200,  # SQL compilado por forma de consulta (default 500)
         connect_args={
             "connect_timeout": 10,
         },
     )
+    # sqlite3 no conoce connect_timeout; su "timeout" es la espera por el lock del archivo.
+    # Se queda con QueuePool (no StaticPool): una sola conexión compartida entre los
+    # hilos de Streamlit mezclaría las transacciones de sesiones distintas.
+    if database_url.startswith("sqlite"):
+        kwargs["connect_args"] = {"timeout": 10}
     # timeouts extra para PyMySQL (si existen)
-    if DATABASE_URL.startswith("mysql+pymysql://"):
+    if database_url.startswith("mysql+pymysql://"):
         kwargs["connect_args"].update({
             "read_timeout": 30,
             "write_timeout": 30,
@@ -49,8 +69,72 @@ def _engine_kwargs() -> dict:
     return kwargs
 
 # ---------- Engine/Sesión ----------
-engine = create_engine(DATABASE_URL, **_engine_kwargs())
-SessionLocal = sessionmaker(bind=engine, expire_on_commit=False, future=True)
+_ENGINES: Dict[str, Engine] = {}
+_ENGINES_LOCK = threading.Lock()
+
+def get_engine(database_url: str = DATABASE_URL) -> Engine:
+    """Un Engine (y su pool) por URL, creado en el primer uso; las llamadas siguientes reutilizan el mismo."""
+    eng = _ENGINES.get(database_url)
+    if eng is None:
+        with _ENGINES_LOCK:
+            eng = _ENGINES.get(database_url)
+            if eng is None:
+                db_file = make_url(database_url).database
+                if database_url.startswith("sqlite") and db_file and db_file != ":memory:":
+                    os.makedirs(os.path.dirname(db_file) or ".", exist_ok=True)
+                eng = create_engine(database_url, **_engine_kwargs(database_url))
+                _ENGINES[database_url] = eng
+    return eng
+
+# Sin engine al importar: importar db.py no abre pools ni toca el disco.
+# Cada sesión se liga al engine (perezoso) al crearse.
+_SessionFactory = sessionmaker(expire_on_commit=False, future=True)
+
+def SessionLocal() -> Session:
+    return _SessionFactory(bind=get_engine())
+
+# Sesión compartida por "request" (un rerun de Streamlit corre entero en un hilo):
+# session_scope() la abre y get_session() la reutiliza, así varias consultas
+# usan una sola conexión del pool (un solo pre-ping) en vez de una cada una.
+_CURRENT_SESSION: ContextVar[Optional[Session]] = ContextVar("_CURRENT_SESSION", default=None)
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    s = SessionLocal()
+    token = _CURRENT_SESSION.set(s)
+    try:
+        yield s
+    finally:
+        _CURRENT_SESSION.reset(token)
+        s.close()
+
+@contextmanager
+def get_session() -> Iterator[Session]:
+    """La sesión del scope actual, o una propia que se cierra al salir."""
+    shared = _CURRENT_SESSION.get()
+    if shared is None:
+        with SessionLocal() as s:
+            yield s
+        return
+    try:
+        yield shared
+    except Exception:
+        shared.rollback()  # deja la sesión usable para las siguientes consultas
+        raise
+
+@contextmanager
+def read_conn() -> Iterator[Connection]:
+    """Conexión Core para lecturas (sin Session/identity map): la de la sesión del scope, o una del pool."""
+    shared = _CURRENT_SESSION.get()
+    if shared is None:
+        with get_engine().connect() as conn:
+            yield conn
+        return
+    try:
+        yield shared.connection()
+    except Exception:
+        shared.rollback()
+        raise
 
 # ---------- Base/Modelos ----------
 class Base(DeclarativeBase):
@@ -62,7 +146,7 @@ class User(Base):
     username: Mapped[str] = mapped_column(String(191), primary_key=True)  # PK
     name: Mapped[str] = mapped_column(String(191), nullable=False)
     role: Mapped[str] = mapped_column(String(32), nullable=False)         # 'admin'|'supervisor'
-    password_hash: Mapped[str] = mapped_column(String(128), nullable=False)  # sha256 hex
+    password_hash: Mapped[str] = mapped_column(String(128), nullable=False)  # scrypt$... (o sha256 hex viejo)
     supervisor_id: Mapped[Optional[str]] = mapped_column(String(191), nullable=True)
 
 class Lavado(Base):
@@ -82,15 +166,46 @@ class Lavado(Base):
 
     __table_args__ = (
         UniqueConstraint("week", "cedis", "unidad_id", name="uq_week_cedis_unidad"),
+        Index("ix_lavados_week_cedis_seg", "week", "cedis", "segmento"),
     )
 
+# Semana + orden por fecha desc (la consulta más frecuente) sin filesort; MySQL 8 guarda el DESC
+Index("ix_lavados_week_ts", Lavado.week, Lavado.ts.desc())
+
+class LavadoFoto(Base):
+    """Un hash de foto por fila: la detección de duplicados es una búsqueda por PK."""
+    __tablename__ = "lavado_fotos"
+    hash: Mapped[str]      = mapped_column(String(64), primary_key=True)  # sha256 hex
+    lavado_id: Mapped[str] = mapped_column(String(32), ForeignKey("lavados.id", ondelete="CASCADE"), index=True)
+    slot: Mapped[str]      = mapped_column(String(32))
+
 # ---------- Bootstrap / Utils ----------
-def init_db(retries: int = 5, backoff_sec: int = 2) -> None:
-    """Crea tablas con reintentos por si la conexión está fría."""
+# DB_AUTO_MIGRATE=0: el esquema lo crea un paso de despliegue (init_db(migrate=True))
+# y los workers arrancan sin reflexión. Por defecto "1" para SQLite local e instalaciones nuevas.
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"
+_INITIALIZED = False
+_INIT_LOCK = threading.Lock()
+
+def init_db(retries: int = 5, backoff_sec: int = 2, migrate: Optional[bool] = None) -> None:
+    """Crea tablas con reintentos por si la conexión está fría; una sola vez por proceso."""
+    global _INITIALIZED
+    if migrate is None:
+        migrate = AUTO_MIGRATE
+    if _INITIALIZED or not migrate:
+        return
+    with _INIT_LOCK:
+        if _INITIALIZED:
+            return
+        _create_schema(retries, backoff_sec)
+        _INITIALIZED = True
+
+def _create_schema(retries: int, backoff_sec: int) -> None:
     attempt = 1
     while True:
         try:
-            Base.metadata.create_all(engine)
+            Base.metadata.create_all(get_engine())
+            _ensure_indexes()
+            _backfill_fotos()
             return
         except OperationalError as e:
             if attempt >= retries:
@@ -98,12 +213,38 @@ def init_db(retries: int = 5, backoff_sec: int = 2) -> None:
             time.sleep(backoff_sec * attempt)
             attempt += 1
 
+def _ensure_indexes() -> None:
+    """create_all no agrega índices nuevos a tablas ya existentes; aquí sí."""
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            idx.create(get_engine(), checkfirst=True)
+
+def _backfill_fotos() -> None:
+    """Primera vez con lavado_fotos: la llena desde foto_hashes_json de los lavados existentes."""
+    with get_session() as s:
+        if s.execute(select(LavadoFoto.hash).limit(1)).first() is not None:
+            return
+        fotos = []
+        for lid, js in s.execute(select(Lavado.id, Lavado.foto_hashes_json)):
+            try:
+                hashes = _loads(js) or {}
+            except Exception:
+                continue  # JSON dañado: ese lavado queda sin hashes, como antes
+            fotos.extend({"hash": h, "lavado_id": lid, "slot": slot} for slot, h in hashes.items() if h)
+        _insert_fotos(s, fotos)
+        s.commit()
+
+# SQL textual compilado una sola vez al importar
+_SQL_PING = text("SELECT 1")
+_SQL_VERSION = text("SELECT VERSION()")
+
 def healthcheck() -> Tuple[bool, str]:
     try:
+        engine = get_engine()
         with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+            conn.execute(_SQL_PING)
             try:
-                ver = conn.execute(text("SELECT VERSION()")).scalar()
+                ver = conn.execute(_SQL_VERSION).scalar()
             except Exception:
                 ver = "desconocida"
             url = engine.url
@@ -119,113 +260,318 @@ def _parse_ts(ts_val: Any) -> datetime.datetime:
         return ts_val
     if isinstance(ts_val, str) and ts_val:
         try:
-            return datetime.datetime.fromisoformat(ts_val.replace("Z","").split("+")[0])
-        except Exception:
+            # 3.11+: fromisoformat ya acepta "Z" y offsets; se guarda la hora tal cual, sin zona
+            return datetime.datetime.fromisoformat(ts_val).replace(tzinfo=None)
+        except ValueError:
             pass
     return datetime.datetime.utcnow()
 
+def _loads(js: Optional[str]) -> Dict[str, Any]:
+    # sin decodificar los vacíos
+    if not js or js == "{}":
+        return {}
+    return orjson.loads(js) if orjson else json.loads(js)
+
+def _dumps(obj: Any) -> Optional[str]:
+    # Vacío -> NULL: no se guarda ni viaja un "{}" por fila (_loads lo lee como {})
+    if not obj:
+        return None
+    if orjson:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
 # ---------- Users ----------
-def upsert_user(u: Dict[str, Any]) -> None:
-    with SessionLocal() as s:
-        row = s.get(User, u["username"])
-        if row is None:
-            row = User(username=u["username"])
-            s.add(row)
-        row.name = u.get("name") or u.get("nombre") or u["username"]
-        row.role = u.get("role", "supervisor")
-        row.password_hash = u.get("sha256") or u.get("password_hash") or ""
-        row.supervisor_id = u.get("supervisor_id")
+# Los usuarios casi no cambian: caché en proceso, acotada y con TTL.
+# upsert_user la invalida; otro proceso verá el cambio al vencer el TTL.
+_USER_CACHE: TTLCache = TTLCache(maxsize=1024, ttl=60)
+_USERS_LIST_CACHE: TTLCache = TTLCache(maxsize=1, ttl=30)
+_USER_CACHE_LOCK = threading.Lock()
+
+def _user_values(u: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        username=u["username"],
+        name=u.get("name") or u.get("nombre") or u["username"],
+        role=u.get("role", "supervisor"),
+        password_hash=u.get("sha256") or u.get("password_hash") or "",
+        supervisor_id=u.get("supervisor_id"),
+    )
+
+def upsert_users_bulk(users: List[Dict[str, Any]]) -> int:
+    """Alta/actualización de varios usuarios en un solo INSERT nativo por bloque."""
+    by_name = {v["username"]: v for v in map(_user_values, users)}  # gana el último
+    rows = list(by_name.values())
+    if not rows:
+        return 0
+    size = _BULK_CHUNK_SQLITE if _DIALECT == "sqlite" else _BULK_CHUNK
+    with get_session() as s:
+        for i in range(0, len(rows), size):
+            chunk = rows[i:i + size]
+            if _dialect_insert is None:
+                for v in chunk:
+                    s.merge(User(**v))
+                continue
+            stmt = _dialect_insert(User).values(chunk)
+            cols = [c for c in chunk[0] if c != "username"]
+            if _DIALECT == "mysql":
+                stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in cols})
+            else:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["username"],
+                    set_={c: stmt.excluded[c] for c in cols},
+                )
+            s.execute(stmt)
         s.commit()
+    with _USER_CACHE_LOCK:
+        for name in by_name:
+            _USER_CACHE.pop(name, None)
+        _USERS_LIST_CACHE.clear()
+    return len(rows)
+
+def upsert_user(u: Dict[str, Any]) -> None:
+    upsert_users_bulk([u])
 
 def get_user(username: str) -> Optional[Dict[str, Any]]:
-    with SessionLocal() as s:
-        row = s.get(User, username)
+    with _USER_CACHE_LOCK:
+        cached = _USER_CACHE.get(username)
+    if cached is not None:
+        return dict(cached)
+    with read_conn() as conn:
+        # lambda_stmt: el SQL se compila una vez; username viaja como parámetro
+        row = conn.execute(lambda_stmt(lambda: select(
+            User.username, User.name, User.role, User.password_hash, User.supervisor_id
+        ).where(User.username == username))).mappings().first()
         if not row:
-            return None
-        return {
-            "username": row.username,
-            "name": row.name,
-            "role": row.role,
-            "sha256": row.password_hash,
-            "supervisor_id": row.supervisor_id,
+            return None  # no se cachea: un alta nueva se ve de inmediato
+        user = {
+            "username": row["username"],
+            "name": row["name"],
+            "role": row["role"],
+            "sha256": row["password_hash"],
+            "supervisor_id": row["supervisor_id"],
         }
+    with _USER_CACHE_LOCK:
+        _USER_CACHE[username] = user
+    return dict(user)
 
 def list_users() -> List[Dict[str, Any]]:
-    with SessionLocal() as s:
-        rows = s.execute(select(User)).scalars().all()
-        return [{
-            "username": r.username,
-            "name": r.name,
-            "role": r.role,
-            "supervisor_id": r.supervisor_id
-        } for r in rows]
+    with _USER_CACHE_LOCK:
+        cached = _USERS_LIST_CACHE.get("all")
+    if cached is None:
+        with read_conn() as conn:
+            cached = [dict(r) for r in conn.execute(
+                select(User.username, User.name, User.role, User.supervisor_id)
+            ).mappings()]
+        with _USER_CACHE_LOCK:
+            _USERS_LIST_CACHE["all"] = cached
+    return [dict(u) for u in cached]
 
 # ---------- Lavados ----------
+def _lavado_values(record: Dict[str, Any]) -> Dict[str, Any]:
+    return dict(
+        id=record["id"],
+        week=record["week"],
+        cedis=record["cedis"],
+        supervisor_id=record.get("supervisorId"),
+        supervisor_nombre=record.get("supervisorNombre",""),
+        unidad_id=record["unidadId"],
+        unidad_label=record.get("unidadLabel", record["unidadId"]),
+        segmento=record.get("segmento",""),
+        ts=_parse_ts(record.get("ts")),
+        created_by=record.get("created_by",""),
+        fotos_json=_dumps(record.get("fotos")),
+        foto_hashes_json=_dumps(record.get("foto_hashes")),
+    )
+
+_LAVADO_KEY = ("week", "cedis", "unidad_id")   # = uq_week_cedis_unidad
+
+# Filas por INSERT multi-VALUES: holgado para max_allowed_packet de MySQL.
+# SQLite viejo limita a 999 parámetros por sentencia (12 columnas por fila).
+_BULK_CHUNK = 1000
+_BULK_CHUNK_SQLITE = 80
+_ID_CHUNK = 900  # ids por DELETE ... IN (un parámetro cada uno)
+
+# INSERT del dialecto, resuelto una vez al importar (None = sin UPSERT nativo)
+_DIALECT = make_url(DATABASE_URL).get_backend_name()  # sin crear el engine
+_dialect_insert = {"mysql": mysql_insert, "postgresql": pg_insert, "sqlite": sqlite_insert}.get(_DIALECT)
+
+def _upsert_lavado_stmt(rows: List[Dict[str, Any]]):
+    """INSERT multi-fila nativo que reemplaza los registros de la misma (week, cedis, unidad); None si el motor no lo soporta."""
+    if _dialect_insert is None:
+        return None
+    cols = [c for c in rows[0] if c not in _LAVADO_KEY]
+    stmt = _dialect_insert(Lavado).values(rows)
+    if _DIALECT == "mysql":
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in cols})
+    return stmt.on_conflict_do_update(
+        index_elements=list(_LAVADO_KEY),
+        set_={c: stmt.excluded[c] for c in cols},
+    )
+
+_FOTO_CHUNK = 300  # 3 columnas por fila: también cabe en el límite de SQLite
+
+def _insert_fotos(s: Session, fotos: List[Dict[str, Any]]) -> None:
+    """INSERT que ignora hashes ya registrados (el primer lavado que subió la foto la conserva)."""
+    for i in range(0, len(fotos), _FOTO_CHUNK):
+        chunk = fotos[i:i + _FOTO_CHUNK]
+        if _DIALECT == "mysql":
+            s.execute(mysql_insert(LavadoFoto).values(chunk).prefix_with("IGNORE"))
+        elif _dialect_insert is not None:
+            s.execute(_dialect_insert(LavadoFoto).values(chunk).on_conflict_do_nothing())
+        else:
+            taken = set(s.execute(
+                select(LavadoFoto.hash).where(LavadoFoto.hash.in_([f["hash"] for f in chunk]))
+            ).scalars())
+            nuevos = {f["hash"]: f for f in chunk if f["hash"] not in taken}
+            if nuevos:
+                s.execute(insert(LavadoFoto), list(nuevos.values()))
+
+def _delete_fotos(s: Session, lavado_ids) -> None:
+    # Explícito: SQLite no aplica ON DELETE CASCADE sin PRAGMA foreign_keys
+    s.execute(delete(LavadoFoto).where(LavadoFoto.lavado_id.in_(lavado_ids)))
+
+def save_lavados_bulk(records: List[Dict[str, Any]]) -> int:
+    """Guarda varios lavados en una sesión y una transacción; devuelve cuántos quedaron escritos."""
+    # Una fila por (week, cedis, unidad), gana la última: ON CONFLICT no admite
+    # tocar dos veces la misma fila dentro de un mismo INSERT
+    by_key: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+    hashes_by_key: Dict[Tuple[str, str, str], Dict[str, str]] = {}
+    for rec in records:
+        values = _lavado_values(rec)
+        key = tuple(values[k] for k in _LAVADO_KEY)
+        by_key[key] = values
+        hashes_by_key[key] = rec.get("foto_hashes") or {}
+    rows = list(by_key.values())
+    if not rows:
+        return 0
+    size = _BULK_CHUNK_SQLITE if _DIALECT == "sqlite" else _BULK_CHUNK
+    with get_session() as s:
+        for i in range(0, len(rows), size):
+            chunk = rows[i:i + size]
+            keys = [tuple(v[k] for k in _LAVADO_KEY) for v in chunk]
+            # Las fotos del registro que se reemplaza se van antes (el upsert cambia su id)
+            _delete_fotos(s, select(Lavado.id).where(
+                tuple_(Lavado.week, Lavado.cedis, Lavado.unidad_id).in_(keys)
+            ))
+            stmt = _upsert_lavado_stmt(chunk)
+            if stmt is not None:
+                s.execute(stmt)  # un round-trip por bloque
+            else:
+                # evitar duplicado por (week, cedis, unidad)
+                s.execute(delete(Lavado).where(
+                    tuple_(Lavado.week, Lavado.cedis, Lavado.unidad_id).in_(keys)
+                ))
+                s.execute(insert(Lavado), chunk)
+            _insert_fotos(s, [
+                {"hash": h, "lavado_id": by_key[key]["id"], "slot": slot}
+                for key in keys
+                for slot, h in hashes_by_key[key].items() if h
+            ])
+        s.commit()
+    return len(rows)
+
 def save_lavado(record: Dict[str, Any]) -> None:
-    with SessionLocal() as s:
-        # evitar duplicado por (week, cedis, unidad)
-        s.execute(delete(Lavado).where(
-            Lavado.week == record["week"],
-            Lavado.cedis == record["cedis"],
-            Lavado.unidad_id == record["unidadId"],
-        ))
-        row = Lavado(
-            id=record["id"],
-            week=record["week"],
-            cedis=record["cedis"],
-            supervisor_id=record.get("supervisorId"),
-            supervisor_nombre=record.get("supervisorNombre",""),
-            unidad_id=record["unidadId"],
-            unidad_label=record.get("unidadLabel", record["unidadId"]),
-            segmento=record.get("segmento",""),
-            ts=_parse_ts(record.get("ts")),
-            created_by=record.get("created_by",""),
-            fotos_json=json.dumps(record.get("fotos") or {}),
-            foto_hashes_json=json.dumps(record.get("foto_hashes") or {}),
-        )
-        s.add(row)
+    save_lavados_bulk([record])
+
+def delete_lavados(ids: Iterable[str]) -> int:
+    """Borra varios lavados (y sus fotos) con un DELETE ... IN por bloque; devuelve cuántos borró."""
+    ids = list(dict.fromkeys(ids))
+    n = 0
+    with get_session() as s:
+        for i in range(0, len(ids), _ID_CHUNK):
+            chunk = ids[i:i + _ID_CHUNK]
+            _delete_fotos(s, chunk)
+            n += s.execute(delete(Lavado).where(Lavado.id.in_(chunk))).rowcount
         s.commit()
+    return n
 
 def delete_lavado(lavado_id: str) -> None:
-    with SessionLocal() as s:
-        s.execute(delete(Lavado).where(Lavado.id == lavado_id))
-        s.commit()
+    delete_lavados([lavado_id])
+
+# Columnas explícitas: filas Core en vez de objetos ORM (sin identity map ni instrumentación)
+_LAVADO_COLS = (
+    Lavado.id, Lavado.week, Lavado.cedis, Lavado.supervisor_id, Lavado.supervisor_nombre,
+    Lavado.unidad_id, Lavado.unidad_label, Lavado.segmento, Lavado.ts, Lavado.created_by,
+    Lavado.fotos_json, Lavado.foto_hashes_json,
+)
+
+def _lavado_dict(r: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": r["id"],
+        "week": r["week"],
+        "cedis": r["cedis"],
+        "supervisorId": r["supervisor_id"],
+        "supervisorNombre": r["supervisor_nombre"],
+        "unidadId": r["unidad_id"],
+        "unidadLabel": r["unidad_label"],
+        "segmento": r["segmento"],
+        "fotos": _loads(r["fotos_json"]),
+        "foto_hashes": _loads(r["foto_hashes_json"]),
+        "ts": (r["ts"] or datetime.datetime.utcnow()).isoformat(timespec="seconds"),
+        "created_by": r["created_by"],
+    }
 
 def get_lavados_week(week: str) -> List[Dict[str, Any]]:
-    with SessionLocal() as s:
-        rows = s.execute(
-            select(Lavado).where(Lavado.week == week).order_by(Lavado.ts.desc())
-        ).scalars().all()
-        out: List[Dict[str, Any]] = []
-        for r in rows:
-            out.append({
-                "id": r.id,
-                "week": r.week,
-                "cedis": r.cedis,
-                "supervisorId": r.supervisor_id,
-                "supervisorNombre": r.supervisor_nombre,
-                "unidadId": r.unidad_id,
-                "unidadLabel": r.unidad_label,
-                "segmento": r.segmento,
-                "fotos": json.loads(r.fotos_json or "{}"),
-                "foto_hashes": json.loads(r.foto_hashes_json or "{}"),
-                "ts": (r.ts or datetime.datetime.utcnow()).isoformat(timespec="seconds"),
-                "created_by": r.created_by,
-            })
-        return out
+    return get_lavados_week_filtered(week)
+
+def get_lavados_week_filtered(
+    week: str,
+    cedis: Optional[str] = None,
+    segmento: Optional[str] = None,
+    supervisor_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Lavados de la semana con los filtros exactos resueltos en SQL (None = sin filtro)."""
+    # lambda_stmt: una compilación en caché por combinación de filtros; los valores son parámetros
+    stmt = lambda_stmt(lambda: select(*_LAVADO_COLS).where(Lavado.week == week))
+    if cedis is not None:
+        stmt += lambda q: q.where(Lavado.cedis == cedis)
+    if segmento is not None:
+        stmt += lambda q: q.where(Lavado.segmento == segmento)
+    if supervisor_id is not None:
+        stmt += lambda q: q.where(Lavado.supervisor_id == supervisor_id)
+    stmt += lambda q: q.order_by(Lavado.ts.desc())
+    with read_conn() as conn:
+        # yield_per: el driver entrega bloques de 500 filas en vez de todo el resultado de golpe
+        rows = conn.execute(stmt, execution_options={"yield_per": 500}).mappings()
+        return [_lavado_dict(r) for r in rows]
+
+# Solo las columnas que usan KPIs/gráficos: sin fotos_json/foto_hashes_json ni su decodificación
+_LITE_COLS = (
+    Lavado.id, Lavado.week, Lavado.cedis, Lavado.supervisor_id, Lavado.supervisor_nombre,
+    Lavado.unidad_id, Lavado.segmento, Lavado.ts, Lavado.created_by,
+)
+
+def get_lavados_week_lite(week: str, supervisor_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    stmt = select(*_LITE_COLS).where(Lavado.week == week)
+    if supervisor_id is not None:
+        stmt = stmt.where(Lavado.supervisor_id == supervisor_id)
+    with read_conn() as conn:
+        rows = conn.execute(stmt.order_by(Lavado.ts.desc())).mappings()
+        return [{
+            "id": r["id"],
+            "week": r["week"],
+            "cedis": r["cedis"],
+            "supervisorId": r["supervisor_id"],
+            "supervisorNombre": r["supervisor_nombre"],
+            "unidadId": r["unidad_id"],
+            "segmento": r["segmento"],
+            "ts": (r["ts"] or datetime.datetime.utcnow()).isoformat(timespec="seconds"),
+            "created_by": r["created_by"],
+        } for r in rows]
 
 def photo_hashes_all() -> Set[str]:
-    with SessionLocal() as s:
-        rows = s.execute(select(Lavado.foto_hashes_json)).scalars().all()
-        hashes: Set[str] = set()
-        for js in rows:
-            try:
-                for h in (json.loads(js or "{}") or {}).values():
-                    if h:
-                        hashes.add(h)
-            except Exception:
-                pass
-        return hashes
+    with read_conn() as conn:
+        return set(conn.execute(select(LavadoFoto.hash)).scalars())
+
+def photo_hashes_exist(hashes: List[str]) -> Set[str]:
+    """Devuelve cuáles de `hashes` ya están registrados (búsqueda por PK, no el universo)."""
+    wanted = {h for h in hashes if h}
+    if not wanted:
+        return set()
+    with read_conn() as conn:
+        return set(conn.execute(
+            select(LavadoFoto.hash).where(LavadoFoto.hash.in_(wanted))
+        ).scalars())
 
 # ⚠️ Importante: NO llames init_db() aquí.
-# Llama init_db() desde app.py dentro de main().
+# Llama init_db() desde app.py dentro de main(); con DB_AUTO_MIGRATE=0, desde el despliegue:
+#   python -c "import db; db.init_db(migrate=True)"
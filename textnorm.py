@@ -0,0 +1,20 @@
+# textnorm.py — normalización de texto para búsquedas y claves (sin acentos, minúsculas).
+# Vive fuera de app.py a propósito: Streamlit re-ejecuta el script en cada rerun,
+# pero un módulo importado se carga una vez por proceso y su caché se conserva.
+
+import unicodedata
+from functools import lru_cache
+from typing import Any
+
+# Acentos que realmente aparecen en catálogos/nombres; el resto cae a unicodedata
+_FOLD = str.maketrans("áéíóúñüÁÉÍÓÚÑÜ", "aeiounuAEIOUNU")
+
+@lru_cache(maxsize=8192)
+def _norm_str(s: str) -> str:
+    t = s.translate(_FOLD)
+    if not t.isascii():
+        t = unicodedata.normalize("NFD", t).encode("ascii", "ignore").decode("ascii")
+    return t.lower().strip()
+
+def norm(s: Any) -> str:
+    return _norm_str(str(s or ""))